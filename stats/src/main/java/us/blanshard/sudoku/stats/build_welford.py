@@ -0,0 +1,31 @@
+# Copyright 2013 Luke Blanshard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compiles the kernels in welford.py ahead of time into the welford_ext
+extension module, which stats.py prefers over compiling them at startup.
+
+Run from this directory: python build_welford.py"""
+
+from numba.pycc import CC
+
+import welford
+
+def main():
+  cc = CC("welford_ext")
+  cc.export("pair_deltas",
+            "void(i8[:, :, :], f8[:, :, :], f8[:, :, :], f8[:, :, :],"
+            " f8[:, :])")(welford.PairDeltas)
+  cc.compile()
+
+if __name__ == "__main__":
+  main()
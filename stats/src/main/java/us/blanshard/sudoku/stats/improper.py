@@ -18,61 +18,66 @@ import os
 import re
 import sys
 
-from collections import defaultdict
+from contextlib import closing
 from datetime import datetime
 
+import numpy as np
+
 from django.conf import settings
 from django.template.loader import render_to_string
 
-from stats import RunningStat
+from stats import StatRows, StatTable
+from tsv import MapFile, ReadColumns
 
 locale.setlocale(locale.LC_ALL, "en_US")
 settings.configure(DEBUG=True, TEMPLATE_DEBUG=True, TEMPLATE_DIRS=("."), TEMPLATE_STRING_IF_INVALID = "%s")
 
-def SummarizeLines(lines, max_solns):
-  def Stat(): return {"solns": RunningStat(), "holes": RunningStat()}
-  def Stats(): return [Stat() for _ in range(max_solns)]
-  def AllStats(): return {"overall": Stat(), "by_solns": Stats()}
-  all = AllStats()
-  symmetries = defaultdict(AllStats)
-  for line in lines:
-    fields = line.split("\t")
-    symmetry = fields[0]
-    solns = int(fields[1])
-    holes = int(fields[2])
-    solns_index = solns - 1
-
-    all["overall"]["solns"].append(solns)
-    all["overall"]["holes"].append(holes)
-    all["by_solns"][solns_index]["solns"].append(solns)
-    all["by_solns"][solns_index]["holes"].append(holes)
-    symmetries[symmetry]["overall"]["solns"].append(solns)
-    symmetries[symmetry]["overall"]["holes"].append(holes)
-    symmetries[symmetry]["by_solns"][solns_index]["solns"].append(solns)
-    symmetries[symmetry]["by_solns"][solns_index]["holes"].append(holes)
-
-  return (all, symmetries)
+MEASURES = ("solns", "holes")
 
-def ConstructData(file_in):
-  summary = file_in.next()
-  if summary.startswith("Generating"):
-    line = file_in.next()
-  else:
-    return Usage("No header lines found")
+def SummarizeLines(lines, max_solns):
+  """Returns the sorted symmetry names and a StatTable of the MEASURES indexed
+     by symmetry and number of solutions."""
+  (symmetry, solns, holes) = ReadColumns(lines, [str, np.int32, np.int32])
+  values = np.column_stack((solns, holes))
 
-  headers = line.split("\t")
+  (symmetryIds, codes) = np.unique(symmetry, return_inverse=True)
+  stats = StatTable((len(symmetryIds), max_solns, len(MEASURES)))
+  cells = np.arange(stats.k.size).reshape(stats.k.shape)[codes, solns - 1]
+  stats.add(cells, values)
 
-  max_solns = int(re.search(r"\((\d+),", summary).group(1))
-  (all, symmetries) = SummarizeLines(file_in, max_solns)
+  return (symmetryIds, stats)
 
-  symmetryIds = sorted(symmetries.keys())
+def ConstructData(file_in):
+  with closing(MapFile(file_in)) as lines:
+    summary = lines.readline()
+    if summary.startswith("Generating"):
+      line = lines.readline()
+    else:
+      return Usage("No header lines found")
+
+    headers = line.split("\t")
+
+    max_solns = int(re.search(r"\((\d+),", summary).group(1))
+    (symmetryIds, stats) = SummarizeLines(lines, max_solns)
+
+  def Stat(table, *index):
+    return dict((name, table[index + (j,)])
+                for (j, name) in enumerate(MEASURES))
+
+  bySolns = stats.combined(0)
+  bySymmetry = stats.combined(1)
+  all = {
+    "overall": Stat(bySolns.combined(0)),
+    "by_solns": StatRows(bySolns, MEASURES),
+    }
 
-  def Symmetry(id):
+  def Symmetry(i):
+    overall = Stat(bySymmetry, i)
     return {
-      "name": id,
-      "solns": symmetries[id]["overall"]["solns"],
-      "holes": symmetries[id]["overall"]["holes"],
-      "by_solns": symmetries[id]["by_solns"],
+      "name": symmetryIds[i],
+      "solns": overall["solns"],
+      "holes": overall["holes"],
+      "by_solns": StatRows(stats, MEASURES, i),
       }
 
   return {
@@ -80,7 +85,7 @@ def ConstructData(file_in):
     "when": datetime.fromtimestamp(os.fstat(file_in.fileno()).st_mtime),
     "count": all["overall"]["solns"].count_formatted(),
     "all": all,
-    "symmetries": [Symmetry(id) for id in symmetryIds],
+    "symmetries": [Symmetry(i) for i in range(len(symmetryIds))],
     }
 
 
@@ -93,7 +98,7 @@ def Usage(msg = None):
 def main():
   if len(sys.argv) != 2:
     Usage();
-  with open(sys.argv[1], "r") as file_in:
+  with open(sys.argv[1], "rb") as file_in:
     data = ConstructData(file_in)
 
   (root, _) = os.path.splitext(sys.argv[1])
@@ -16,16 +16,20 @@
 
 import sys
 
+import numpy as np
+
+from tsv import ReadColumns
+
 def main():
-  results = []
-  for line in sys.stdin:
-    fields = line.split("\t")
-    steps = [int(fields[i]) for i in range(3, len(fields), 2)]
-    slow_count = sum([s > 32 for s in steps])
-    avg_slow = sum([s for s in steps if s > 32]) / slow_count
-    if slow_count * avg_slow > 500:
-      results.append((avg_slow, slow_count, fields[0], fields[1], fields[2]))
+  columns = ReadColumns(sys.stdin, [str, str, str], rest=np.int64)
+  steps = columns[3][:, ::2]
+  slow = steps > 32
+  slow_count = slow.sum(1)
+  avg_slow = np.where(slow, steps, 0).sum(1) // np.maximum(slow_count, 1)
+  keep = slow_count * avg_slow > 500
 
+  results = zip(avg_slow[keep], slow_count[keep],
+                *[column[keep] for column in columns[:3]])
   for result in sorted(results, reverse=True):
     print "{}\t{}\t{}\t{}\t{}".format(*result)
 
@@ -11,20 +11,52 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Class for tracking the mean and standard deviation of a series of values."""
+"""Classes for tracking the mean and standard deviation of series of values."""
 
 import math
 
+import numpy as np
+
+def _Jit(**options):
+  """Returns a decorator that compiles its function with numba, if numba is
+     installed.  Otherwise the function is left as plain Python."""
+  try:
+    from numba import njit
+  except ImportError:
+    return lambda f: f
+  return njit(**options)
+
+try:
+  # Built by build_welford.py; saves compiling the kernels on every run.
+  from welford_ext import pair_deltas as _PairDeltas
+  _SerialPairDeltas = _PairDeltas
+except ImportError:
+  import welford
+  _PairDeltas = _Jit(cache=True, fastmath=True, parallel=True)(
+      welford.PairDeltas)
+  # Not cached: numba's cache for PairDeltas can't tell this build from the
+  # parallel one.
+  _SerialPairDeltas = _Jit(fastmath=True)(welford.PairDeltas)
+
 class RunningStat(object):
   """Computes the running mean/variance/stddev of the values added.
 
   See http://www.johndcook.com/standard_deviation.html."""
+  __slots__ = ("k", "m", "s", "_fmt", "_kfmt")
+
   def __init__(self, fmt="{:8.5n}", kfmt="{:n}"):
     self.k = 0
     self.m = 0.0
     self.s = 0.0
-    self.fmt = fmt
-    self.kfmt = kfmt
+    self._fmt = fmt.format
+    self._kfmt = kfmt.format
+
+  @classmethod
+  def from_state(cls, state):
+    """Returns a statistic with the given (k, m, s) state."""
+    stat = cls()
+    (stat.k, stat.m, stat.s) = state
+    return stat
 
   def __repr__(self):
     return "<RunningStat %d: %g %g %g>" % (len(self), self.mean(), self.variance(), self.standard_deviation())
@@ -36,9 +68,9 @@ class RunningStat(object):
 
   def append(self, x):
     """Adds the given value to the statistic, updating estimates."""
-    self.k += 1
+    self.k = k = self.k + 1
     prev_m = self.m
-    self.m = m = prev_m + (x - prev_m) / self.k
+    self.m = m = prev_m + (x - prev_m) / k
     self.s += (x - prev_m) * (x - m)
 
   def mean(self):
@@ -51,13 +83,107 @@ class RunningStat(object):
     return math.sqrt(self.variance())
 
   def count_formatted(self):
-    return self.kfmt.format(self.k)
+    return self._kfmt(self.k)
 
   def mean_formatted(self):
-    return self.fmt.format(self.mean())
+    return self._fmt(self.mean())
 
   def variance_formatted(self):
-    return self.fmt.format(self.variance())
+    return self._fmt(self.variance())
 
   def standard_deviation_formatted(self):
-    return self.fmt.format(self.standard_deviation())
+    return self._fmt(self.standard_deviation())
+
+
+class StatTable(object):
+  """A table of statistics stored as parallel NumPy arrays of counts, means,
+  and sums of squared differences from the mean."""
+  def __init__(self, shape):
+    self.k = np.zeros(shape, dtype=np.int64)
+    self.m = np.zeros(shape, dtype=np.float64)
+    self.s = np.zeros(shape, dtype=np.float64)
+
+  def __getitem__(self, index):
+    """Returns a RunningStat holding the state of the given cell."""
+    return RunningStat.from_state(
+        (int(self.k[index]), float(self.m[index]), float(self.s[index])))
+
+  def __setitem__(self, index, state):
+    """Sets the given cell to the given (k, m, s) state."""
+    (self.k[index], self.m[index], self.s[index]) = state
+
+  def add(self, cells, xs):
+    """Adds each value in xs to the cell whose flat index is the corresponding
+       entry of cells."""
+    cells = np.ravel(cells)
+    xs = np.ravel(xs)
+    k = np.bincount(cells, minlength=self.k.size)
+    m = np.bincount(cells, weights=xs, minlength=self.k.size) / np.maximum(k, 1)
+    d = xs - m[cells]
+    added = StatTable(self.k.shape)
+    added.k[...] = k.reshape(self.k.shape)
+    added.m[...] = m.reshape(self.k.shape)
+    added.s[...] = np.bincount(cells, weights=d * d,
+                               minlength=self.k.size).reshape(self.k.shape)
+    self.merge(added)
+
+  def merge(self, other):
+    """Adds the values of each cell of another table of the same shape to the
+       corresponding cell of this one, using the pairwise formula of Chan et
+       al."""
+    k = self.k + other.k
+    d = other.m - self.m
+    w = np.true_divide(other.k, np.maximum(k, 1))
+    self.s += other.s + d * d * self.k * w
+    self.m += d * w
+    self.k = k
+
+  def combined(self, axis):
+    """Returns a table with the given axis removed, each of its cells combining
+       the cells along that axis."""
+    k = self.k.sum(axis)
+    m = (self.k * self.m).sum(axis) / np.maximum(k, 1)
+    d = self.m - np.expand_dims(m, axis)
+    table = StatTable(k.shape)
+    table.k[...] = k
+    table.m[...] = m
+    table.s[...] = self.s.sum(axis) + (self.k * d * d).sum(axis)
+    return table
+
+class StatRows(object):
+  """A read-only sequence over one axis of a StatTable, for templates.  Element
+  i is a dict mapping each of the given measure names to a RunningStat for the
+  cell at the leading index, then i, then that measure's position along the
+  table's last axis.  The RunningStats are built only as each element is
+  reached, so rendering never holds a copy of the whole table."""
+  def __init__(self, table, names, *index):
+    self._table = table
+    self._names = names
+    self._index = index
+
+  def __len__(self):
+    return self._table.k.shape[len(self._index)]
+
+  def __getitem__(self, i):
+    if not 0 <= i < len(self):
+      raise IndexError(i)
+    index = self._index + (i,)
+    return dict((name, self._table[index + (j,)])
+                for (j, name) in enumerate(self._names))
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+def DeltaTable(values, parallel=True):
+  """Given a three-dimensional array of values indexed by row, column and
+     measure, returns a StatTable whose cell [a, b, j] holds the differences
+     between columns a and b of measure j.  Pass parallel=False from worker
+     processes, so they don't each start a thread per CPU."""
+  (_, ncols, nmeasures) = values.shape
+  table = StatTable((ncols, ncols, nmeasures))
+  values = np.asarray(values, dtype=np.float64)
+  means = values.sum(0) / float(max(len(values), 1))
+  kernel = _PairDeltas if parallel else _SerialPairDeltas
+  kernel(table.k, table.m, table.s, values, means)
+  return table
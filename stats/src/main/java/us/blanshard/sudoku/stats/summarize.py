@@ -14,86 +14,138 @@
 """Summarizes the output of GenStats."""
 
 import locale
+import multiprocessing
 import os
 import sys
 
-from collections import defaultdict
+from contextlib import closing
 from datetime import datetime
 
+import numpy as np
+
 from django.conf import settings
 from django.template.loader import render_to_string
 
-from stats import RunningStat
+from stats import DeltaTable, StatRows, StatTable
+from tsv import ChunkOffsets, MapFile, MapRange, ReadColumns
 
 locale.setlocale(locale.LC_ALL, "en_US")
 settings.configure(DEBUG=True, TEMPLATE_DEBUG=True, TEMPLATE_DIRS=("."), TEMPLATE_STRING_IF_INVALID = "%s")
 
-def SummarizeLines(lines, ngenerators):
-  def Stat(): return {"time": RunningStat(), "clues": RunningStat()}
-  def Stats(): return [Stat() for _ in range(ngenerators)]
-  def AllStats(): return {"overall": Stat(), "by_generator": Stats()}
-  symmetries = defaultdict(AllStats)
-  generators = [AllStats() for _ in range(ngenerators)]
-  for line in lines:
-    fields = line.split("\t")
-    symmetry = fields[0]
-    time = [float(fields[n]) / 1000.0 for n in range(3, len(fields), 2)]
-    clues = [int(fields[n]) for n in range(2, len(fields), 2)]
-
-    for n in range(ngenerators):
-      symmetries[symmetry]["overall"]["time"].append(time[n])
-      symmetries[symmetry]["overall"]["clues"].append(clues[n])
-      symmetries[symmetry]["by_generator"][n]["time"].append(time[n])
-      symmetries[symmetry]["by_generator"][n]["clues"].append(clues[n])
-
-      generators[n]["overall"]["time"].append(time[n])
-      generators[n]["overall"]["clues"].append(clues[n])
-
-      for m in range(ngenerators):
-        generators[n]["by_generator"][m]["time"].append(time[n] - time[m])
-        generators[n]["by_generator"][m]["clues"].append(clues[n] - clues[m])
-
-  return (symmetries, generators)
+MEASURES = ("time", "clues")
+
+# Files with less than this many bytes of data per CPU are read in fewer
+# chunks, down to a single one read without starting any worker processes.
+MIN_CHUNK_BYTES = 16 << 20
+
+def SummarizeLines(lines, ngenerators, parallel=True):
+  """Returns the sorted symmetry names, a StatTable of the MEASURES by symmetry
+     and generator, and a StatTable of the differences in the MEASURES between
+     pairs of generators.  parallel is passed on to DeltaTable."""
+  columns = ReadColumns(lines,
+                        [str, None] + [np.int32, np.float64] * ngenerators)
+  clues = np.column_stack(columns[1::2])
+  time = np.column_stack(columns[2::2]) / 1000.0
+
+  values = np.dstack((time, clues))
+
+  (symmetryIds, codes) = np.unique(columns[0], return_inverse=True)
+  stats = StatTable((len(symmetryIds), ngenerators, len(MEASURES)))
+  cells = np.arange(stats.k.size).reshape(stats.k.shape)[codes]
+  stats.add(cells, values)
+
+  return (symmetryIds, stats, DeltaTable(values, parallel))
+
+def SummarizeChunk(args):
+  """Runs SummarizeLines on the lines between two byte offsets of a file.
+     Takes a single tuple of arguments so it can be mapped over a Pool."""
+  (name, start, end, ngenerators) = args
+  with open(name, "rb") as file_in:
+    with closing(MapFile(file_in)) as lines:
+      return SummarizeLines(MapRange(lines, start, end), ngenerators,
+                            parallel=False)
+
+def MergeSummaries(summaries):
+  """Combines the results of SummarizeLines on separate chunks of a file into
+     the result for the whole file."""
+  summaries = list(summaries)
+  symmetryIds = np.unique(np.concatenate([ids for (ids, _, _) in summaries]))
+  (_, stats, deltas) = summaries[0]
+  stats = StatTable((len(symmetryIds),) + stats.k.shape[1:])
+  deltas = StatTable(deltas.k.shape)
+  for (ids, chunkStats, chunkDeltas) in summaries:
+    aligned = StatTable(stats.k.shape)
+    aligned[np.searchsorted(symmetryIds, ids)] = (
+        chunkStats.k, chunkStats.m, chunkStats.s)
+    stats.merge(aligned)
+    deltas.merge(chunkDeltas)
+  return (symmetryIds, stats, deltas)
 
 def ConstructData(file_in):
-  line = file_in.next()
-  if line.startswith("Generating"):
-    line = file_in.next()
-  else:
-    return Usage("No header lines found")
-
-  headers = line.split("\t")
-  generatorIds = [h.split(":")[0] for h in headers if h.endswith(":Num Clues")]
-  ngenerators = len(generatorIds)
-
-  (symmetries, generators) = SummarizeLines(file_in, ngenerators)
-
-  symmetryIds = sorted(symmetries.keys())
+  with closing(MapFile(file_in)) as lines:
+    line = lines.readline()
+    if line.startswith("Generating"):
+      line = lines.readline()
+    else:
+      return Usage("No header lines found")
+
+    headers = line.split("\t")
+    generatorIds = [h.split(":")[0]
+                    for h in headers if h.endswith(":Num Clues")]
+    ngenerators = len(generatorIds)
+
+    nchunks = min(multiprocessing.cpu_count(),
+                  (len(lines) - lines.tell()) // MIN_CHUNK_BYTES)
+    if nchunks < 2:
+      (symmetryIds, stats, deltas) = SummarizeLines(lines, ngenerators)
+    else:
+      offsets = ChunkOffsets(lines, nchunks)
+      chunks = [(file_in.name, start, end, ngenerators)
+                for (start, end) in zip(offsets, offsets[1:])]
+      # Compile the workers' kernel before forking them, so they inherit it
+      # instead of each compiling their own.
+      DeltaTable(np.zeros((0, ngenerators, len(MEASURES))), parallel=False)
+      pool = multiprocessing.Pool(len(chunks))
+      try:
+        (symmetryIds, stats, deltas) = MergeSummaries(
+            pool.imap(SummarizeChunk, chunks))
+      finally:
+        pool.close()
+        pool.join()
+  bySymmetry = stats.combined(1)
+  byGenerator = stats.combined(0)
 
   def ToName(id):
     return " ".join([w.capitalize() for w in id.split("_")])
 
+  def Stat(table, *index):
+    return dict((name, table[index + (j,)])
+                for (j, name) in enumerate(MEASURES))
+
   def Generator(n):
+    overall = Stat(byGenerator, n)
     return {
       "name": ToName(generatorIds[n]),
-      "time": generators[n]["overall"]["time"],
-      "clues": generators[n]["overall"]["clues"],
-      "by_generator": generators[n]["by_generator"],
+      "time": overall["time"],
+      "clues": overall["clues"],
+      "by_generator": StatRows(deltas, MEASURES, n),
       }
 
-  def Symmetry(id):
+  def Symmetry(i):
+    overall = Stat(bySymmetry, i)
     return {
-      "name": ToName(id),
-      "time": symmetries[id]["overall"]["time"],
-      "clues": symmetries[id]["overall"]["clues"],
-      "by_generator": symmetries[id]["by_generator"],
+      "name": ToName(symmetryIds[i]),
+      "time": overall["time"],
+      "clues": overall["clues"],
+      "by_generator": StatRows(stats, MEASURES, i),
       }
 
+  generatorData = [Generator(n) for n in range(ngenerators)]
   return {
-    "count": generators[0]["overall"]["time"].count_formatted(),
+    "count": generatorData[0]["time"].count_formatted(),
     "when": datetime.fromtimestamp(os.fstat(file_in.fileno()).st_mtime),
-    "generators": [Generator(n) for n in range(ngenerators)],
-    "symmetries": [Symmetry(id) for id in symmetryIds],
+    "generators": generatorData,
+    "symmetries": [Symmetry(i) for i in range(len(symmetryIds))],
     }
 
 
@@ -106,7 +158,7 @@ def Usage(msg = None):
 def main():
   if len(sys.argv) != 2:
     Usage();
-  with open(sys.argv[1], "r") as file_in:
+  with open(sys.argv[1], "rb") as file_in:
     data = ConstructData(file_in)
 
   (root, _) = os.path.splitext(sys.argv[1])
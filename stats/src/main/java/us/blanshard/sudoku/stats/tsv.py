@@ -0,0 +1,107 @@
+# Copyright 2013 Luke Blanshard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Reads tab-separated stats output into NumPy columns."""
+
+import mmap
+
+import numpy as np
+
+try:
+  import pandas
+except ImportError:
+  pandas = None
+
+def MapFile(file_in):
+  """Maps the contents of file_in into memory read-only.  The returned mmap can
+     be read like a file, straight out of the OS page cache."""
+  return mmap.mmap(file_in.fileno(), 0, access=mmap.ACCESS_READ)
+
+def ChunkOffsets(lines, nchunks):
+  """Splits the rest of the mmap lines into at most nchunks pieces of about the
+     same size, each ending at a line boundary.  Returns the byte offsets that
+     bound the pieces, from the map's current position to its end."""
+  offsets = [lines.tell()]
+  for i in range(1, nchunks):
+    target = offsets[0] + (len(lines) - offsets[0]) * i // nchunks
+    offset = lines.find("\n", target - 1) + 1
+    if offsets[-1] < offset < len(lines):
+      offsets.append(offset)
+  offsets.append(len(lines))
+  return offsets
+
+class MapRange(object):
+  """A file-like reader of the bytes of an mmap from start up to end.  Lets a
+     chunk of a mapped file be parsed without first copying it out of the
+     map."""
+
+  def __init__(self, lines, start, end):
+    self._lines = lines
+    self._end = end
+    lines.seek(start)
+
+  def read(self, size=-1):
+    left = max(self._end - self._lines.tell(), 0)
+    return self._lines.read(left if size < 0 else min(size, left))
+
+  def readline(self):
+    if self._lines.tell() >= self._end:
+      return ""
+    return self._lines.readline()
+
+  def __iter__(self):
+    return iter(self.readline, "")
+
+def ReadColumns(file_in, dtypes, rest=None):
+  """Parses the remaining lines of file_in as tab-separated fields.
+
+  dtypes gives the type of each leading field, or None for fields to skip.
+  Returns a list holding a NumPy array for each field that isn't skipped.  If
+  rest is given, the fields following the leading ones are converted to that
+  type and appended to the list as a single two-dimensional array; otherwise
+  they are ignored."""
+  if pandas is None:
+    return _SplitColumns(file_in, dtypes, rest)
+  usecols = [i for i, dtype in enumerate(dtypes) if dtype is not None]
+  try:
+    frame = pandas.read_csv(file_in, sep="\t", header=None, engine="c",
+                            usecols=usecols if rest is None else None,
+                            na_filter=False,
+                            dtype=dict((i, dtypes[i]) for i in usecols))
+  except pandas.errors.EmptyDataError:
+    return _EmptyColumns(dtypes, rest)
+  columns = [frame[i].values for i in usecols]
+  if rest is not None:
+    columns.append(frame.iloc[:, len(dtypes):].values.astype(rest))
+  return columns
+
+def _SplitColumns(file_in, dtypes, rest):
+  """ReadColumns without pandas.  The lines are still split in Python, but
+     each column is converted to its type in a single NumPy call."""
+  fields = np.array([line.rstrip("\n").split("\t")
+                     for line in iter(file_in.readline, "")])
+  if not len(fields):
+    return _EmptyColumns(dtypes, rest)
+  columns = [fields[:, i].astype(object if dtype is str else dtype)
+             for i, dtype in enumerate(dtypes) if dtype is not None]
+  if rest is not None:
+    columns.append(fields[:, len(dtypes):].astype(rest))
+  return columns
+
+def _EmptyColumns(dtypes, rest):
+  """What ReadColumns returns when there are no lines left to parse."""
+  columns = [np.empty(0, object if dtype is str else dtype)
+             for dtype in dtypes if dtype is not None]
+  if rest is not None:
+    columns.append(np.empty((0, 0), rest))
+  return columns
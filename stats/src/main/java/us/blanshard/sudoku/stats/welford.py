@@ -0,0 +1,39 @@
+# Copyright 2013 Luke Blanshard
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Numerical kernels behind stats.py, written in the subset of Python that
+numba compiles.  stats.py compiles them just in time, unless build_welford.py
+has compiled them ahead of time."""
+
+try:
+  from numba import prange
+except ImportError:
+  prange = range
+
+def PairDeltas(k, m, s, values, means):
+  """Sets each state (k, m, s)[a, b, j] to hold values[:, a, j] - values[:, b,
+     j], given the means of values over its first axis.  All the measures j of
+     a pair of columns are updated in the same pass over the rows."""
+  nrows = values.shape[0]
+  ncols = values.shape[1]
+  nmeasures = values.shape[2]
+  for a in prange(ncols):
+    for b in range(ncols):
+      for j in range(nmeasures):
+        k[a, b, j] = nrows
+        m[a, b, j] = means[a, j] - means[b, j]
+        s[a, b, j] = 0.0
+      for i in range(nrows):
+        for j in range(nmeasures):
+          d = values[i, a, j] - values[i, b, j] - m[a, b, j]
+          s[a, b, j] += d * d